@@ -50,8 +50,63 @@ def fidelities(probs):
         fid = qml.math.fidelity(bitflip_circuit(p), circuit())
         fids[i] = fid
     return np.round_(fids, decimals=5).tolist()
-    
-    
+
+
+def bitflip_weights(probs):
+    """The probabilities of no flip and of a flip of BitFlip(p) channels.
+
+    They are read from the Kraus matrices, each proportional to I or X, at
+    p = 0 and p = 1 only: the channel is affine in p, so are the weights.
+
+    Args:
+        probs (array(float)):
+            The bitflip probabilities.
+
+    Returns:
+        (numpy.array): The weights, of shape (2, len(probs)).
+    """
+    I = np.eye(2)
+    X = qml.matrix(qml.PauliX(0))
+    w0, w1 = [
+        np.array([sum(np.abs(np.trace(P @ K) / 2) ** 2 for K in kraus) for P in (I, X)])
+        for kraus in (qml.BitFlip(0.0, wires=0).kraus_matrices(),
+                      qml.BitFlip(1.0, wires=0).kraus_matrices())
+    ]
+    p = np.asarray(probs, dtype=float)
+    return w0[:, None] + (w1 - w0)[:, None] * p
+
+
+def fidelities_sweep(probs):
+    """Vectorized version of fidelities(), for sweeps over many probabilities.
+
+    The ideal state is pure, so the fidelity reduces to Tr(rho_ideal rho_noisy).
+    The two bitflip channels make rho_noisy a mixture of rho_ideal conjugated by
+    II, IX, XI and XX, weighted by the probabilities of bitflip_weights: the
+    four overlaps are computed once from a single run of circuit(), then all
+    the fidelities follow from one matrix product.
+
+    Args:
+        probs (array(float)):
+            The bitflip probabilities.
+
+    Returns:
+        (numpy.array): The fidelities, not rounded.
+    """
+    rho = circuit()
+    if not np.isclose(np.real(np.trace(rho @ rho)), 1.0):
+        # no pure-state fast path
+        return np.array([qml.math.fidelity(bitflip_circuit(p), rho) for p in probs])
+
+    I = np.eye(2)
+    X = qml.matrix(qml.PauliX(0))
+    flips = [np.kron(a, b) for a in (I, X) for b in (I, X)]
+    overlaps = np.array([np.real(np.trace(rho @ F @ rho @ F)) for F in flips])
+
+    w = bitflip_weights(probs)
+    weights = np.stack([w[0] * w[0], w[0] * w[1], w[1] * w[0], w[1] * w[1]])
+    return overlaps @ weights
+
+
 def run(test_case_input: str) -> str:
     probs = json.loads(test_case_input)
     fids = fidelities(probs)
@@ -67,19 +122,26 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[0.05, 0.1, 0.15, 0.2, 0.25]', '[0.905, 0.82, 0.745, 0.68, 0.625]']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
-
-    try:
-        output = run(input_)
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
+        try:
+            output = run(input_)
 
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
 
+            else:
+                print("Correct!")
+
+    # the sweep models bitflip_circuit by hand, check that they still agree
+    probs = json.loads(test_cases[0][0])
+    if np.allclose(fidelities_sweep(probs), fidelities(probs), atol=1e-5):
+        print("fidelities_sweep agrees with fidelities.")
+    else:
+        print("fidelities_sweep disagrees with fidelities, update its noise model!")
@@ -8,6 +8,78 @@ import pennylane.numpy as np
 ########################### our code ###############################
 
 
+NUM_WIRES = 3
+
+
+def model_circuit(n, train_params, x, model_type):
+    """
+    Quantum function of the in-series or parallel model. Both x and the
+    entries of train_params may be arrays of equal length, in which case the
+    gates are broadcast over them.
+
+    Args: see quantum_model.
+    """
+    if model_type == "parallel":
+        # W(1)
+        qml.Hadamard(wires=0)
+        qml.CRX(train_params[0], wires=(0,1))
+        qml.Hadamard(wires=1)
+        qml.CRX(train_params[0], wires=(1,2))
+        qml.Hadamard(wires=2)
+        qml.CRX(train_params[0], wires=(2,0))
+
+        # S
+        for i in range(NUM_WIRES):
+            qml.RX(x, wires=i)
+
+
+        # W(2)
+        qml.Hadamard(wires=0)
+        qml.CRX(train_params[1], wires=(0,1))
+        qml.Hadamard(wires=1)
+        qml.CRX(train_params[1], wires=(1,2))
+        qml.Hadamard(wires=2)
+        qml.CRX(train_params[1], wires=(2,0))
+
+    elif model_type == "series":
+        for i in range(n+1):
+            # W(i)
+            qml.Hadamard(wires=0)
+            qml.CRX(train_params[i], wires=(0,1))
+            qml.Hadamard(wires=1)
+            qml.CRX(train_params[i], wires=(1,2))
+            qml.Hadamard(wires=2)
+            qml.CRX(train_params[i], wires=(2,0))
+            
+            # S
+            if(i != n): qml.RX(x, wires = 0)
+
+
+# compiled models, keyed by (n, model_type)
+_compiled_models = {}
+
+def compiled_model(n, model_type):
+    """
+    Returns the QNode of a model, building its device and circuit only once
+    per (n, model_type).
+
+    Returns:
+        (qml.QNode): circuit(train_params, x), the expectation value of PauliZ on the first wire.
+    """
+    key = (n, model_type)
+    if key not in _compiled_models:
+        dev = qml.device('default.qubit', wires = NUM_WIRES)
+
+        @qml.qnode(dev, cache=False)
+        def circuit(train_params, x):
+            model_circuit(n, train_params, x, model_type)
+            # Return an expectation value
+            return qml.expval(qml.PauliZ(0))
+
+        _compiled_models[key] = circuit
+    return _compiled_models[key]
+
+
 def quantum_model(n, train_params, x, model_type):
     """
     Builds an in-series or parallel quantum model according to the specifications in the problem statement, returning
@@ -24,58 +96,50 @@ def quantum_model(n, train_params, x, model_type):
     Returns: 
         (float): The expectation value of PauliZ measurements on the first wire.
     """ 
-    
-    num_wires=3
+    circuit = compiled_model(n, model_type)
 
-    dev = qml.device('default.qubit', wires = num_wires)
+    # Finally, return a float, not a numpy tensor. You can do this using the .numpy() method!
+    return circuit(train_params, x).numpy()
 
-    # Write any helper functions, such as subcircuits you may use later, here.
 
-    @qml.qnode(dev)
-    def circuit(n, train_params, x, model_type):
-        if model_type == "parallel":
-            # W(1)
-            qml.Hadamard(wires=0)
-            qml.CRX(train_params[0], wires=(0,1))
-            qml.Hadamard(wires=1)
-            qml.CRX(train_params[0], wires=(1,2))
-            qml.Hadamard(wires=2)
-            qml.CRX(train_params[0], wires=(2,0))
-
-            # S
-            for i in range(num_wires):
-                qml.RX(x, wires=i)
+def quantum_model_batch(n, train_params, x, model_type, chunk_size=10000):
+    """
+    Batched version of quantum_model: evaluates the model on many inputs with
+    broadcast executions of the compiled circuit.
 
+    Args:
+        n (int): The total number of encoding gates.
+        train_params (array(float)): Either one parameter list of length n + 1, shared by all
+                    the inputs, or an array of shape (B, n + 1) with one parameter list per input.
+        x (array(float)): The input data points, of shape (B,). A single float is
+                    shared by all the parameter lists.
+        model_type (str): "series" or "parallel".
+        chunk_size (int): Maximum number of inputs per execution, bounds the memory of the
+                    broadcast statevector.
+
+    Returns:
+        (numpy.array): The expectation values, of shape (B,).
+    """
+    train_params = np.array(train_params, dtype=float, requires_grad=False)
+    x = np.array(x, dtype=float, requires_grad=False)
+
+    if train_params.ndim == 2:
+        if x.ndim == 0:
+            x = np.full(len(train_params), x, requires_grad=False)
+        elif len(x) != len(train_params):
+            raise ValueError(f"{len(x)} inputs but {len(train_params)} parameter lists")
+    x = np.atleast_1d(x)
+
+    circuit = compiled_model(n, model_type)
+    outputs = []
+    for start in range(0, len(x), chunk_size):
+        stop = start + chunk_size
+        # each gate parameter becomes a vector of the batch
+        params = train_params[start:stop].T if train_params.ndim == 2 else train_params
+        outputs.append(np.atleast_1d(circuit(params, x[start:stop]).numpy()))
+    return np.concatenate(outputs).numpy() if outputs else np.zeros(0).numpy()
 
-            # W(2)
-            qml.Hadamard(wires=0)
-            qml.CRX(train_params[1], wires=(0,1))
-            qml.Hadamard(wires=1)
-            qml.CRX(train_params[1], wires=(1,2))
-            qml.Hadamard(wires=2)
-            qml.CRX(train_params[1], wires=(2,0))
-
-        elif model_type == "series":
-            for i in range(n+1):
-                # W(i)
-                qml.Hadamard(wires=0)
-                qml.CRX(train_params[i], wires=(0,1))
-                qml.Hadamard(wires=1)
-                qml.CRX(train_params[i], wires=(1,2))
-                qml.Hadamard(wires=2)
-                qml.CRX(train_params[i], wires=(2,0))
-                
-                # S
-                if(i != n): qml.RX(x, wires = 0)
-
-        
-        # Return an expectation value
-        return qml.expval(qml.PauliZ(0))
 
-    # Finally, return a float, not a numpy tensor. You can do this using the .numpy() method!
-    return circuit(n, train_params, x, model_type).numpy()
-    
-    
 ####################################################################
 
 
@@ -113,18 +177,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[2,[0.4,0.8,1.0],1.2,"parallel"]', '0.977856732420062'], ['[3,[0.6,0.7,0.8,1.2],1.3,"series"]', '0.37048658401504975']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    try:
-        output = run(input_)
+        try:
+            output = run(input_)
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
-
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
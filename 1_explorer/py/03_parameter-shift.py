@@ -22,44 +22,125 @@ def circuit(params):
     return qml.expval(qml.PauliZ(0) + qml.PauliZ(1))
 
 
-def my_parameter_shift_grad(params, shift):
-    """Your homemade parameter-shift rule function.
-    
-    NOTE: you cannot use qml.grad within this function
+def execute_batch(param_sets):
+    """Runs the circuit on a stack of parameter sets, in one broadcast execution.
 
     Args:
-        params (list(float)): The parameters for gates in the circuit
+        param_sets (array(float)): Parameter sets, of shape (..., P)
 
     Returns:
-        gradient (numpy.array): The gradient of the circuit with respect to the given parameters.
+        (numpy.array): The expectation values, of shape (...)
+    """
+    param_sets = np.array(param_sets, dtype=float, requires_grad=False)
+    flat = np.reshape(param_sets, (-1, param_sets.shape[-1]))
+
+    # each gate parameter becomes a vector over the stack
+    with qml.tape.QuantumTape() as tape:
+        circuit.func(flat.T)
+
+    # default.qubit cannot broadcast the expectation value of a Hamiltonian
+    # (here PauliZ(0) + PauliZ(1)), measure its terms separately instead
+    if isinstance(tape.observables[0], qml.Hamiltonian):
+        tapes, fn = qml.transforms.hamiltonian_expand(tape, group=False)
+    else:
+        tapes, fn = [tape], lambda res: res[0]
+
+    res = fn(qml.execute(tapes, circuit.device, gradient_fn=None, cache=False))
+    return np.reshape(res, param_sets.shape[:-1])
+
+
+def shifted_params(params, shift):
+    """Stacks the 2P shifted parameter sets of the parameter-shift rule.
+
+    Args:
+        params (array(float)): The parameters, of shape (P,) or (M, P) for M points
+        shift (float): Value of the shift
+
+    Returns:
+        (numpy.array): Shape (..., 2P, P), the P sets shifted by +shift come
+        first, followed by the P sets shifted by -shift.
+    """
+    params = np.array(params, dtype=float, requires_grad=False)
+    shifts = shift * np.eye(params.shape[-1])
+    points = params[..., None, :]
+    return np.concatenate([points + shifts, points - shifts], axis=-2)
+
+
+def parameter_shift_jacobian(params, shift):
+    """Parameter-shift gradient at one or many parameter points, from a single
+    broadcast execution of all the shifted parameter sets.
+
+    Args:
+        params (array(float)): The parameters, of shape (P,) or (M, P) for M points
+        shift (float): Value of the shift
+
+    Returns:
+        (numpy.array): The gradient, of shape (P,), or the gradients of the M points, of shape (M, P)
     """
+    values = execute_batch(shifted_params(params, shift))
+    plus, minus = np.split(values, 2, axis=-1)
+    return (plus - minus) / (2*np.sin(shift))
 
-    def shift_vector(vector, pos, shift):
-        """This function creates the "shifted parameters" to feed in the circuit
 
-        Args:
-            vector (list(float)): The parameter vector to shift
-            pos (int): The component to shift
-            shift (float) : Value of the shift
+def parameter_shift_hessian(params, shift, cache=None):
+    """Parameter-shift Hessian, from the double-shift rule
 
-        Return:
-            shifted_vectors : (Tuple) Vectors of with opposite shifts
-        """
-        vector_plus  = np.copy(vector)
-        vector_minus = np.copy(vector)
+        H_ij = [f(+s_i +s_j) - f(+s_i -s_j) - f(-s_i +s_j) + f(-s_i -s_j)] / (4 sin^2(shift))
 
-        vector_plus[pos]  += shift 
-        vector_minus[pos] -= shift
+    The diagonal terms share the unshifted point f(params), and H_ij = H_ji
+    share all of theirs: the 2P^2 + 1 unique points are run once, in a single
+    broadcast execution, instead of the 4P^2 of the naive rule.
 
-        return (vector_plus, vector_minus)
+    Args:
+        params (list(float)): The parameters for gates in the circuit
+        shift (float): Value of the shift
+        cache (dict): Optional memo of the circuit values, keyed by parameter
+            point. Points already in it are not run again, new ones are added.
 
-    gradient = np.zeros_like(params)
+    Returns:
+        hessian (numpy.array): The (P, P) Hessian of the circuit.
+    """
+    params = np.array(params, dtype=float, requires_grad=False)
+    eye = np.eye(len(params), dtype=int)
 
+    # the four terms of each entry, as integer offsets in units of shift
+    entries = []
     for i in range(len(params)):
-        shift_plus, shift_minus = shift_vector(params, i, shift)
-        gradient[i] = (circuit(shift_plus) - circuit(shift_minus) )
+        for j in range(i, len(params)):
+            offsets = [eye[i] + eye[j], eye[i] - eye[j], eye[j] - eye[i], - eye[i] - eye[j]]
+            entries.append((i, j, [tuple(int(k) for k in o) for o in offsets]))
+
+    points = {}
+    for _, _, offsets in entries:
+        for offset in offsets:
+            if offset not in points:
+                point = params + shift * np.array(offset)
+                points[offset] = tuple(float(p) for p in point)
 
-    gradient = gradient / (2*np.sin(shift))
+    memo = {} if cache is None else cache
+    missing = sorted({point for point in points.values() if point not in memo})
+    if missing:
+        memo.update(zip(missing, execute_batch(missing).tolist()))
+
+    hessian = np.zeros((len(params), len(params)))
+    for i, j, offsets in entries:
+        f = [memo[points[offset]] for offset in offsets]
+        hessian[i, j] = hessian[j, i] = (f[0] - f[1] - f[2] + f[3]) / (4*np.sin(shift)**2)
+    return hessian
+
+
+def my_parameter_shift_grad(params, shift):
+    """Your homemade parameter-shift rule function.
+    
+    NOTE: you cannot use qml.grad within this function
+
+    Args:
+        params (list(float)): The parameters for gates in the circuit
+
+    Returns:
+        gradient (numpy.array): The gradient of the circuit with respect to the given parameters.
+    """
+    gradient = parameter_shift_jacobian(params, shift)
     print('GRAD', gradient)
     return np.round_(gradient, decimals=5).tolist()
     
@@ -79,18 +160,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[[0.75, 1.0], 1.23]', '[-0.68164, -0.84147]']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    try:
-        output = run(input_)
+        try:
+            output = run(input_)
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
-
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import json
+import numpy as onp
 import pennylane as qml
 import pennylane.numpy as np
 
@@ -46,18 +48,201 @@ def error(U, params):
 
 
 
-def train_parameters(U):
+def get_matrix_batch(params):
+    """
+    Vectorized get_matrix.
 
-    epochs = 1000
-    lr = 0.01
+    Args:
+        - params (array): The parameters (alpha, beta, gamma, phi), of shape (N, 4).
+    Returns:
+        - (array): The N associated matrices, of shape (N, 2, 2).
+    """
+    alpha, beta, gamma, phi = [params[:, k] for k in range(4)]
+    c, s = np.cos(beta/2), np.sin(beta/2)
+    plus, minus = np.exp(0.5j*(alpha + gamma)), np.exp(0.5j*(alpha - gamma))
+    rot = np.stack([np.stack([c/plus, -minus*s], -1),
+                    np.stack([s/minus, plus*c], -1)], -2)
+    return np.exp(1j*phi)[:, None, None] * rot
+
+
+def error_batch(U, params):
+    """
+    Vectorized error: the errors of N parameter sets against N target matrices.
 
-    grad = qml.grad(error, argnum=1)
-    params = np.random.rand(4) * np.pi
+    Args:
+        - U (array): The target matrices, of shape (N, 2, 2).
+        - params (array): The parameters, of shape (N, 4).
+    Returns:
+        - (array): The N errors.
+    """
+    diff = np.real(get_matrix_batch(params)) - U
+    return np.sqrt(np.sum(diff**2, axis=(-1, -2)))
 
-    for epoch in range(epochs):
-        params -= lr * grad(U, params)
 
-    return params
+def fit_parameters_batch(U):
+    """
+    Closed-form fit of the model to a stack of real target matrices.
+
+    Any real 2x2 matrix is x1 I + x2 J + x3 Z + x4 X, with J = [[0, -1], [1, 0]].
+    The real part of e^{i phi} W, with W = [[a, -b*], [b, a*]] in SU(2), is
+    cos(phi) (Re(a) I + Re(b) J) - sin(phi) (Im(a) Z + Im(b) X): its directions
+    in the (I, J) and (Z, X) planes are free, and its radii (r1, r2) reach
+    exactly the triangle r1 + r2 <= 1. The minimum of error is then the
+    projection of the target radii on that triangle, and the parameters follow
+    from a ZYZ decomposition of W. Unitary targets are matched exactly.
+
+    Args:
+        - U (array): The target matrices, of shape (N, 2, 2) or (2, 2).
+    Returns:
+        - (array): The parameters (alpha, beta, gamma, phi), of shape (N, 4) or (4,).
+    """
+    U = np.array(U, dtype=float, requires_grad=False)
+    single = U.ndim == 2
+    U = U.reshape(-1, 2, 2)
+
+    x12 = np.stack([U[:, 0, 0] + U[:, 1, 1], U[:, 1, 0] - U[:, 0, 1]], -1) / 2
+    x34 = np.stack([U[:, 0, 0] - U[:, 1, 1], U[:, 1, 0] + U[:, 0, 1]], -1) / 2
+    r1, r2 = np.linalg.norm(x12, axis=-1), np.linalg.norm(x34, axis=-1)
+    d12 = np.where(r1[:, None] > 0, x12 / np.where(r1 > 0, r1, 1)[:, None], [1.0, 0.0])
+    d34 = np.where(r2[:, None] > 0, x34 / np.where(r2 > 0, r2, 1)[:, None], [1.0, 0.0])
+
+    # projection of the radii on the reachable triangle
+    inside = r1 + r2 <= 1
+    u = np.where(inside, r1, np.clip((r1 - r2 + 1) / 2, 0, 1))
+    v = np.where(inside, r2, 1 - u)
+
+    # u = cos(phi) cos(theta) and v = sin(phi) sin(theta), i.e. cos(phi -+ theta) = u +- v
+    minus = np.arccos(np.clip(u + v, -1, 1))
+    plus = np.arccos(np.clip(u - v, -1, 1))
+    phi, theta = (plus + minus) / 2, (plus - minus) / 2
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+
+    a = cos_theta*d12[:, 0] - 1j*sin_theta*d34[:, 0]
+    b = cos_theta*d12[:, 1] - 1j*sin_theta*d34[:, 1]
+
+    # ZYZ decomposition of W = Rot(alpha, beta, gamma)
+    beta = 2*np.arctan2(np.abs(b), np.abs(a))
+    alpha = - np.angle(a) - np.angle(b)
+    gamma = - np.angle(a) + np.angle(b)
+    params = np.stack([alpha, beta, gamma, phi], -1)
+
+    return params[0] if single else params
+
+
+def jacobian_batch(params):
+    """
+    Vectorized derivatives of np.real(get_matrix(params)).
+
+    Args:
+        - params (array): The parameters (alpha, beta, gamma, phi), of shape (N, 4).
+    Returns:
+        - (array): The derivatives of the 4 real entries with respect to the 4
+          parameters, of shape (N, 4, 4).
+    """
+    alpha, beta, gamma, phi = [params[:, k] for k in range(4)]
+    matrix = get_matrix_batch(params)
+    # alpha and gamma, and phi, only enter as phases of the entries
+    d_alpha = 0.5j * matrix * np.array([[-1, 1], [-1, 1]])
+    d_gamma = 0.5j * matrix * np.array([[-1, -1], [1, 1]])
+    d_phi = 1j * matrix
+    d_beta = get_matrix_batch(np.stack([alpha, beta + np.pi, gamma, phi], -1)) / 2
+    d = np.stack([d_alpha, d_beta, d_gamma, d_phi], -1)
+    return np.real(d).reshape(-1, 4, 4)
+
+
+def _descend(U, seeds, max_steps, tol, grad_tol, patience):
+    """
+    Levenberg-Marquardt descent of error from one random start per seed, all
+    the starts advanced together as a batch. A start stops when its error
+    drops below tol, or on a plateau: when its gradient norm drops below
+    grad_tol, or its error has not decreased by a relative 1e-9 in patience steps.
+
+    Returns:
+        - (tuple): The final parameters (K, 4), errors (K,) and steps (K,) of the K starts.
+    """
+    params = np.array([onp.random.default_rng(s).random(4) * np.pi for s in seeds],
+                      requires_grad=False)
+    U = np.broadcast_to(U, (len(seeds), 2, 2))
+    damping = np.full(len(seeds), 1e-3)
+    errors = error_batch(U, params)
+    steps = np.zeros(len(seeds), dtype=int)
+    stalled = np.zeros(len(seeds), dtype=int)
+
+    for step in range(max_steps):
+        residual = (np.real(get_matrix_batch(params)) - U).reshape(-1, 4)
+        J = jacobian_batch(params)
+        g = np.einsum("nij,ni->nj", J, residual)
+        active = (errors > tol) & (np.linalg.norm(g, axis=-1) > grad_tol) & (stalled < patience)
+        if not np.any(active):
+            break
+
+        # damped Gauss-Newton step, the damping of each start adapts to its progress
+        JtJ = np.einsum("nij,nik->njk", J, J) + damping[:, None, None] * np.eye(4)
+        trial = params - np.linalg.solve(JtJ, g[..., None])[..., 0]
+        trial_errors = error_batch(U, trial)
+        better = active & (trial_errors < errors)
+        stalled = np.where(active & (trial_errors < errors * (1 - 1e-9)), 0, stalled + 1)
+        params = np.where(better[:, None], trial, params)
+        errors = np.where(better, trial_errors, errors)
+        damping = np.clip(np.where(better, damping / 3, damping * 4), 1e-12, 1e12)
+        steps = steps + active
+
+    return params, errors, steps
+
+
+def train_parameters_multistart(U, starts=8, seed=1967, max_steps=1000,
+                                tol=1e-8, grad_tol=1e-10, patience=10, workers=None):
+    """
+    Multi-start optimization, returning the best of the starts.
+
+    Each start draws its initial point from its own RNG stream, spawned from
+    seed with numpy.random.SeedSequence, so the result only depends on seed
+    and starts, whether the starts run as one vectorized batch (workers=None)
+    or split on a process pool.
+
+    Args:
+        - U (matrix): Goal matrix that we want to approach.
+        - starts (int): Number of random starts.
+        - seed (int): Seed of the starts.
+        - max_steps (int): Maximum number of steps of each start.
+        - tol (float): A start stops once its error is below tol.
+        - grad_tol (float): A start stops once its gradient norm is below grad_tol.
+        - patience (int): A start stops after patience steps without progress.
+        - workers (int): Number of worker processes, or None to run vectorized in-process.
+    Returns:
+        - (array): The parameters of the start with the lowest error.
+    """
+    U = np.array(U, dtype=float, requires_grad=False)
+    seeds = onp.random.SeedSequence(seed).spawn(starts)
+    options = (max_steps, tol, grad_tol, patience)
+
+    if workers is None:
+        params, errors, _ = _descend(U, seeds, *options)
+    else:
+        # start k runs in chunk k % workers, its stream does not depend on the split
+        chunks = [seeds[k::workers] for k in range(min(workers, starts))]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_descend, [U]*len(chunks), chunks,
+                                    *[[o]*len(chunks) for o in options]))
+        order = np.argsort(np.concatenate([np.arange(starts)[k::workers] for k in range(len(chunks))]))
+        params = np.concatenate([r[0] for r in results])[order]
+        errors = np.concatenate([r[1] for r in results])[order]
+
+    return params[np.argmin(errors)]
+
+
+def train_parameters(U, mode="analytic"):
+    """
+    Args:
+        - U (matrix): Goal matrix that we want to approach.
+        - mode (str): "analytic" for the closed-form fit, "multistart" for the
+          multi-start gradient descent.
+    Returns:
+        - (array): The four parameters of the model.
+    """
+    if mode == "multistart":
+        return train_parameters_multistart(U)
+    return fit_parameters_batch(U)
 
 
 # These functions are responsible for testing the solution.
@@ -76,18 +261,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[[ 0.70710678,  0.70710678], [ 0.70710678, -0.70710678]]', '[[ 0.70710678,  0.70710678], [ 0.70710678, -0.70710678]]'], ['[[ 1,  0], [ 0, -1]]', '[[ 1,  0], [ 0, -1]]']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    try:
-        output = run(input_)
+        try:
+            output = run(input_)
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
-
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
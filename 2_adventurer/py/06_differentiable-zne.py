@@ -52,9 +52,8 @@ def global_fold_circuit(angle, n, s):
         n: The number of times U^\dagger U is applied
         s: The integer defining L_s ... L_d.
     """
-    assert s <= len(
-        circuit_ops(angle)
-    ), "The value of s is upper-bounded by the number of gates in the circuit."
+    ops = circuit_ops(angle)
+    assert s <= len(ops), "The value of s is upper-bounded by the number of gates in the circuit."
 
     U(angle)  # Original circuit application
 
@@ -63,7 +62,7 @@ def global_fold_circuit(angle, n, s):
         qml.adjoint(U)(angle)
         U(angle)
 
-    subU = circuit_ops(angle)[(s-1)::] # selecting the operators L_i from s to d
+    subU = ops[(s-1)::] # selecting the operators L_i from s to d
 
     # L_d^\dagger ... L_s^\dagger
     for op in subU[::-1]:  qml.adjoint(op)
@@ -74,12 +73,148 @@ def global_fold_circuit(angle, n, s):
     return qml.state()
 
 
+# Sweep mode. Every gate of the folded circuit runs on dev_noisy as the gate
+# followed by the inserted noise: each such step is compiled once into a
+# superoperator acting on the vectorized density matrix, and the density
+# matrices shared by several (n, s) are computed once.
+
+_reference_states = {}
+
+def reference_state(angle):
+    """The state of circuit(angle), cached per angle."""
+    if angle not in _reference_states:
+        _reference_states[angle] = circuit(angle)
+    return _reference_states[angle]
+
+
+@qml.tape.stop_recording()
+def noisy_superoperator(op):
+    """The superoperator of op as executed on dev_noisy, noise included.
+
+    Args:
+        op (qml.operation.Operation): A gate of the circuit
+
+    Returns:
+        (numpy.array): Shape (16, 16), acting on the row-major vectorized density matrix.
+    """
+    tape = qml.tape.QuantumTape([op])
+    superop = np.eye(16, dtype=complex, requires_grad=False)
+    for step in dev_noisy.expand_fn(tape).operations:
+        if isinstance(step, qml.operation.Channel):
+            kraus = [qml.math.expand_matrix(K, step.wires, wire_order=dev_noisy.wires)
+                     for K in step.kraus_matrices()]
+        else:
+            kraus = [qml.matrix(step, wire_order=dev_noisy.wires)]
+        superop = sum(np.kron(K, np.conj(K)) for K in kraus) @ superop
+    return superop
+
+
+def _apply(superops, rho):
+    for superop in superops:
+        rho = superop @ rho
+    return rho
+
+
+_compiled_folds = {}
+
+def compiled_fold(angle):
+    """The noisy superoperators of the folding procedure, cached per angle.
+
+    Args:
+        angle (float): The phase angle for an IsingXY operator
+
+    Returns:
+        (tuple): The superoperators of the gates L_i and of their adjoints, in
+        circuit order, and of the whole noisy U and U^\dagger U blocks.
+    """
+    if angle not in _compiled_folds:
+        ops = circuit_ops(angle)
+        forward = [noisy_superoperator(op) for op in ops]
+        backward = [noisy_superoperator(qml.adjoint(op)) for op in ops]
+        block_U = _apply(forward, np.eye(16, requires_grad=False))
+        block_fold = _apply(forward, _apply(backward[::-1], np.eye(16, requires_grad=False)))
+        _compiled_folds[angle] = forward, backward, block_U, block_fold
+    return _compiled_folds[angle]
+
+
+def global_fold_state(angle, n, s):
+    """Superoperator mode of global_fold_circuit.
+
+    (U^\dagger U)^n is applied as a power of the compiled U^\dagger U block,
+    by repeated squaring: O(log n) 16x16 products instead of O(n depth)
+    gate applications.
+
+    Args:
+        angle (float): The phase angle for an IsingXY operator
+        n: The number of times U^\dagger U is applied
+        s: The integer defining L_s ... L_d.
+
+    Returns:
+        (numpy.array): The (4, 4) density matrix of global_fold_circuit(angle, n, s).
+    """
+    forward, backward, block_U, block_fold = compiled_fold(angle)
+    assert s <= len(forward), "The value of s is upper-bounded by the number of gates in the circuit."
+
+    rho = np.zeros(16, dtype=complex, requires_grad=False)
+    rho[0] = 1
+    rho = np.linalg.matrix_power(block_fold, n) @ (block_U @ rho)
+    rho = _apply(forward[s-1:], _apply(backward[s-1:][::-1], rho))
+    return rho.reshape(4, 4)
+
+
+def global_fold_sweep(angles, ns, ss):
+    """Fidelities of global_fold_circuit(angle, n, s) for a grid of angles, n and s.
+
+    For each angle, the noisy superoperators and the reference state are
+    built once. The density matrix is checkpointed after U and after every
+    requested number of folds, so that n only costs the folds added since the
+    previous one (as a power of the U^\dagger U block), and for each n the
+    L_d^\dagger ... L_s^\dagger half is shared by all the values of s, from
+    the largest s down.
+
+    Args:
+        angles (list(float)): The phase angles
+        ns (list(int)): The numbers of U^\dagger U folds
+        ss (list(int)): The values of s
+
+    Returns:
+        (numpy.array): The fidelities, of shape (len(angles), len(ns), len(ss)), not rounded.
+    """
+    fids = np.zeros((len(angles), len(ns), len(ss)), requires_grad=False)
+    rho0 = np.zeros(16, dtype=complex, requires_grad=False)
+    rho0[0] = 1
+
+    for a, angle in enumerate(angles):
+        forward, backward, block_U, block_fold = compiled_fold(angle)
+        assert max(ss) <= len(forward), "The value of s is upper-bounded by the number of gates in the circuit."
+        reference = reference_state(angle)
+
+        results = {}
+        rho, folds = block_U @ rho0, 0
+        for n in sorted(set(ns)):
+            # (U^\dagger U)^n, continuing from the previous checkpoint
+            rho = np.linalg.matrix_power(block_fold, n - folds) @ rho
+            folds = n
+
+            # L_d^\dagger ... L_s^\dagger, then L_s ... L_d for each s
+            tail, done = rho, len(forward) + 1
+            for s in sorted(set(ss), reverse=True):
+                tail = _apply(backward[s-1:done-1][::-1], tail)
+                done = s
+                state = _apply(forward[s-1:], tail).reshape(4, 4)
+                results[n, s] = qml.math.fidelity(state, reference)
+
+        fids[a] = [[results[n, s] for s in ss] for n in ns]
+    return fids
+
+
 
 
 ####################################################################
 
-def fidelity(angle, n, s):
-    fid = qml.math.fidelity(global_fold_circuit(angle, n, s), circuit(angle))
+def fidelity(angle, n, s, mode="circuit"):
+    state = global_fold_state(angle, n, s) if mode == "superoperator" else global_fold_circuit(angle, n, s)
+    fid = qml.math.fidelity(state, reference_state(angle))
     return np.round_(fid, decimals=5)
 
 
@@ -100,18 +235,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[0.4, 2, 3]', '0.79209']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    try:
-        output = run(input_)
+        try:
+            output = run(input_)
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
-
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
\ No newline at end of file
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
\ No newline at end of file
@@ -1,5 +1,8 @@
+import concurrent.futures
 import functools
 import json
+import multiprocessing
+import numpy as onp
 import pennylane as qml
 import pennylane.numpy as np
 
@@ -8,6 +11,90 @@ import pennylane.numpy as np
 ########################### our code ###############################
 
 
+NUM_WIRES = 3
+DEGREE = 3
+
+
+def basic_entangler(params, index):
+    """Trainable block: RX on every wire from params[index:index+3], then a ring of CNOTs.
+
+    Returns: (int): The index of the next unused parameter.
+    """
+    for wire in range(NUM_WIRES):
+        qml.RX(params[index], wires = wire)
+        index += 1
+
+    qml.CNOT(wires = [0,1])
+    qml.CNOT(wires = [1,2])
+    qml.CNOT(wires = [2,0])
+    return index
+
+
+def model_circuit(param_list, x):
+    """
+    Quantum function of the model. Both x and the entries of param_list may
+    be arrays of equal length, in which case the gates are broadcast over them.
+    """
+    index = 0
+
+    index = basic_entangler(param_list, index)
+
+    for wire in range(NUM_WIRES):
+        qml.RX(x, wires = wire)
+
+    index = basic_entangler(param_list, index)
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_circuit():
+    """
+    Returns the QNode of the model, building its device and circuit only once.
+
+    Returns:
+        (qml.QNode): circuit(param_list, x), the PauliZ expectation of the first wire.
+    """
+    dev = qml.device("default.qubit", wires=NUM_WIRES)
+
+    @qml.qnode(dev, cache=False)
+    def circuit(param_list, x):
+        """This circuit returns the PauliZ expectation of
+        the quantum model in the statement"""
+        model_circuit(param_list, x)
+        return qml.expval(qml.PauliZ(0))
+
+    return circuit
+
+
+def fourier_coefficients_batch(param_list, degree=DEGREE):
+    """
+    Fourier coefficients of the model, as computed by qml.fourier.coefficients
+    (without lowpass filter), for one or many parameter sets. All the sampling
+    points of all the parameter sets are run in one broadcast execution.
+
+    Args:
+        param_list (array(float)): The six parameters, of shape (6,) or (M, 6)
+        degree (int): Max frequency of the coefficients
+
+    Returns:
+        (numpy.array): The 2*degree+1 coefficients, in numpy.fft order, of
+        shape (2*degree+1,) or (M, 2*degree+1)
+    """
+    params = np.array(param_list, dtype=float, requires_grad=False)
+    flat = params.reshape(-1, params.shape[-1])
+
+    # f is sampled at 2 pi n / k for n = -degree, ..., degree, stored at index n mod k
+    k = 2*degree + 1
+    n = np.arange(-degree, degree + 1)
+    xs = 2*np.pi / k * n
+
+    values = compiled_circuit()(np.repeat(flat, k, axis=0).T, np.tile(xs, len(flat)))
+    f_discrete = np.zeros((len(flat), k))
+    f_discrete[:, n % k] = np.reshape(values, (len(flat), k))
+
+    coeffs = np.fft.fft(f_discrete, axis=-1) / k
+    return coeffs.reshape(params.shape[:-1] + (k,))
+
+
 def fourier_squared_distance(list_of_coeffs, param_list):
     """
     Returns the squared l2-distance in Fourier space between a function
@@ -26,42 +113,106 @@ def fourier_squared_distance(list_of_coeffs, param_list):
                       and the output of the quantum model
     """
 
-    dev = qml.device("default.qubit", wires=3)
+    # the coefficients, from one batched execution of the cached circuit
+    b = fourier_coefficients_batch(param_list)
 
-    # Feel free to define any helper functions, such as subcircuits, here.
-    def basic_entangler(params, index):
-        for wire in range(3):
-            qml.RX(params[index], wires = wire)
-            index += 1
+    # Write a function that calculates the squared l2-distance here
+    # Return your final answer here
+    return np.sum( np.absolute( list_of_coeffs - b )**2 )
 
-        qml.CNOT(wires = [0,1])
-        qml.CNOT(wires = [1,2])
-        qml.CNOT(wires = [2,0])
-        return index
-    
-    @qml.qnode(dev)
-    def circuit(param_list, x):
-        """This circuit returns the PauliZ expectation of
-        the quantum model in the statement"""
-        # Put your code here #
-        index = 0
+def fourier_squared_distance_batch(list_of_coeffs, param_lists):
+    """
+    Population version of fourier_squared_distance: the distances of M
+    candidate parameter sets, from one batched execution.
 
-        index = basic_entangler(param_list, index)
+    Args:
+        list_of_coeffs (list(float)): The seven target coefficients
+        param_lists (array(float)): The candidates, of shape (M, 6)
 
-        for wire in range(3):
-            qml.RX(x, wires = wire)
+    Returns: (numpy.array): The M squared l2-distances
+    """
+    coeffs = fourier_coefficients_batch(param_lists)
+    return np.sum(np.absolute(np.array(list_of_coeffs) - coeffs)**2, axis=-1)
 
-        index = basic_entangler(param_list, index)
 
-        return qml.expval(qml.PauliZ(0))
+def fourier_distance_grad_batch(list_of_coeffs, param_lists):
+    """
+    Squared distances and their gradients for M candidate parameter sets.
+
+    Every parameter enters a single RX gate, so the coefficients obey the
+    two-term parameter-shift rule exactly: the M points and their 12 shifted
+    copies run in the same batched execution.
+
+    Args:
+        list_of_coeffs (list(float)): The seven target coefficients
+        param_lists (array(float)): The candidates, of shape (M, 6)
+
+    Returns: (tuple): The M distances, and their gradients of shape (M, 6)
+    """
+    params = np.array(param_lists, dtype=float, requires_grad=False).reshape(-1, 6)
+    shifts = np.pi/2 * np.concatenate([np.zeros((1, 6)), np.eye(6), -np.eye(6)])
+    coeffs = fourier_coefficients_batch(params[:, None, :] + shifts)
+
+    residual = coeffs[:, 0] - np.array(list_of_coeffs)
+    d_coeffs = (coeffs[:, 1:7] - coeffs[:, 7:]) / 2
+    grad = 2 * np.real(np.sum(np.conj(residual)[:, None, :] * d_coeffs, axis=-1))
+    return np.sum(np.absolute(residual)**2, axis=-1), grad
+
+
+def _fit_population(list_of_coeffs, params, steps, lr, tol, stop=None):
+    """Gradient descent of the whole population at once, until the best distance
+    drops below tol. With a shared stop event, the chunks of a pool stop together:
+    the first one to converge sets it, the others see it on their next step."""
+    for step in range(steps):
+        if stop is not None and stop.is_set():
+            break
+        distances, grad = fourier_distance_grad_batch(list_of_coeffs, params)
+        if np.min(distances) < tol:
+            if stop is not None:
+                stop.set()
+            break
+        params = params - lr * grad
+    return params, fourier_squared_distance_batch(list_of_coeffs, params)
+
+
+def fit_fourier_coefficients(list_of_coeffs, population=32, steps=500, lr=0.5, tol=1e-10,
+                             seed=0, workers=None):
+    """
+    Fits the six parameters of the model to target Fourier coefficients, by
+    gradient descent of fourier_squared_distance from a population of random
+    starts.
+
+    Args:
+        list_of_coeffs (list(float)): The seven target coefficients
+        population (int): Number of random starts
+        steps (int): Maximum number of descent steps
+        lr (float): Learning rate
+        tol (float): Stops once a candidate is closer than tol, in every
+                     worker when the population is shared
+        seed (int): Seed of the random starts
+        workers (int): Number of worker processes sharing the population, or
+                       None to run it in-process as a single batch
+
+    Returns: (tuple): The best parameters and their squared distance
+    """
+    rng = onp.random.default_rng(seed)
+    params = np.array(rng.uniform(0, 2*np.pi, (population, 6)), requires_grad=False)
+
+    if workers is None:
+        params, distances = _fit_population(list_of_coeffs, params, steps, lr, tol)
+    else:
+        chunks = np.array_split(params, min(workers, population))
+        with multiprocessing.Manager() as manager, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            stop = manager.Event()
+            results = list(pool.map(_fit_population, *zip(*[(list_of_coeffs, c, steps, lr, tol, stop)
+                                                             for c in chunks])))
+        params = np.concatenate([r[0] for r in results])
+        distances = np.concatenate([r[1] for r in results])
+
+    best = np.argmin(distances)
+    return params[best], distances[best]
 
-    # just a trick, then compute the fourier coefficients
-    partial_circuit = functools.partial(circuit, param_list)
-    b = qml.fourier.coefficients(partial_circuit, 1, 3)
-    
-    # Write a function that calculates the squared l2-distance here
-    # Return your final answer here
-    return np.sum( np.absolute( list_of_coeffs - b )**2 )
 
 ####################################################################
 
@@ -98,18 +249,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['[[-1.12422548e-01,  0.0, 9.47909940e-02, 0.0, 0.0, 9.47909940e-02, 0.0],[2,2,2,3,4,5]]', '0.0036766085933034303'], ['[[-2.51161988e-01, 0.0, 1.22546112e-01, 0.0, 0.0,  1.22546112e-01, 0.0],[1.1,0.3,0.4,0.6,0.8,0.9]]', '0.6538589174369286']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
-
-    try:
-        output = run(input_)
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
+        try:
+            output = run(input_)
 
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
\ No newline at end of file
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
\ No newline at end of file
@@ -1,7 +1,62 @@
+import concurrent.futures
+import hashlib
 import json
+import os
+import numpy as onp
 import pennylane as qml
 import pennylane.numpy as np
 
+# Hamiltonians are cached on disk, one .npz file (coefficients, Pauli words
+# and qubit count) per molecule, and in memory once loaded.
+HAMILTONIAN_CACHE = os.environ.get(
+    "HAMILTONIAN_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "codecamp22-hamiltonians")
+)
+COORDINATE_DECIMALS = 8
+
+_hamiltonians = {}
+
+def cached_molecular_hamiltonian(symbols, coordinates, basis="sto-3g"):
+    """qml.qchem.molecular_hamiltonian, cached by symbols, rounded coordinates and basis.
+
+    Args:
+        symbols (list(str)): The atomic symbols.
+        coordinates (np.array): The atomic coordinates, in Bohr.
+        basis (str): The atomic basis set.
+
+    Returns:
+        H (qml.Hamiltonian): The qubit Hamiltonian.
+        qubits (int): The number of qubits.
+    """
+    # the rounded coordinates only key the cache, the Hamiltonian is built
+    # from the given ones, unchanged, to be the one molecular_hamiltonian returns
+    rounded = np.round(np.array(coordinates, dtype=float, requires_grad=False), COORDINATE_DECIMALS) + 0.0
+    key = json.dumps([list(symbols), rounded.tolist(), basis])
+    if key in _hamiltonians:
+        return _hamiltonians[key]
+
+    path = os.path.join(HAMILTONIAN_CACHE, hashlib.sha256(key.encode()).hexdigest() + ".npz")
+    if os.path.exists(path):
+        with onp.load(path) as data:
+            coeffs, words, qubits = data["coeffs"], data["words"].tolist(), int(data["qubits"])
+        wire_map = {wire: wire for wire in range(qubits)}
+        ops = [qml.grouping.string_to_pauli_word(word, wire_map=wire_map) for word in words]
+        H = qml.Hamiltonian(np.array(coeffs, requires_grad=False), ops)
+    else:
+        H, qubits = qml.qchem.molecular_hamiltonian(symbols, coordinates, basis=basis)
+        wire_map = {wire: wire for wire in range(qubits)}
+        words = [qml.grouping.pauli_word_to_string(op, wire_map=wire_map) for op in H.ops]
+
+        # written to a temporary file first, concurrent jobs may share the cache
+        os.makedirs(HAMILTONIAN_CACHE, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        onp.savez_compressed(tmp, coeffs=onp.array(H.coeffs, dtype=float),
+                             words=onp.array(words), qubits=qubits)
+        os.replace(tmp, path)
+
+    _hamiltonians[key] = H, qubits
+    return H, qubits
+
+
 def hydrogen_hamiltonian(d):
     """Creates the H_2 Hamiltonian from a separation distance.
 
@@ -15,7 +70,7 @@ def hydrogen_hamiltonian(d):
 
     symbols = symbols = ["H", "H"]
     coordinates = np.array([0.0, 0.0, -d, 0.0, 0.0, d])
-    H, qubits = qml.qchem.molecular_hamiltonian(symbols, coordinates)
+    H, qubits = cached_molecular_hamiltonian(symbols, coordinates)
 
     return H, qubits
 
@@ -29,27 +84,144 @@ def ansatz_template(param, wires):
     qml.BasisState([1, 1, 0, 0], wires=wires)
     qml.DoubleExcitation(param, wires=wires)
 
-def VQE(qnode):
-    """Performs a VQE routine given a QNode.
+def vqe_optimize(qnode, param=0.0, num_iters=20, tol=None):
+    """Gradient descent of the energy of a QNode.
 
     Args:
-        qnode (qml.QNode):
-            The ansatz that will be optimized in order to find the ground state
-            of molecular hydrogen.
+        qnode (qml.QNode): The ansatz.
+        param (float): The starting parameter.
+        num_iters (int): The maximum number of steps.
+        tol (float): Stops early once a step changes the energy by less than tol.
 
-    Retuns:
-        final_energy (float): The final energy from the VQE routine.
+    Returns:
+        param (np.array): The optimized parameter.
+        final_energy (float): Its energy.
     """
-    param = np.array(0.0, requires_grad=True)
-    num_iters = 20
+    param = np.array(param, requires_grad=True)
     opt = qml.GradientDescentOptimizer(stepsize=0.4)
 
+    energy = None
     for _ in range(num_iters):
-        param = opt.step(qnode, param)
+        param, previous = opt.step_and_cost(qnode, param)
+        if tol is not None and energy is not None and abs(previous - energy) < tol:
+            break
+        energy = previous
 
     final_energy = qnode(param)
 
-    return final_energy
+    return param, final_energy
+
+
+def sinusoid_minimum(values, shifts, base_frequency=1.0):
+    """Minimum of the trigonometric polynomial
+    a_0 + sum_k a_k cos(k w x) + b_k sin(k w x), k = 1, ..., R, through the
+    2R + 1 points (shifts, values), with shifts equidistant over one period
+    2 pi / w.
+
+    Returns:
+        shift (float): The position of the minimum, relative to the points.
+        value (float): The minimum.
+    """
+    R = (len(values) - 1) // 2
+    coeffs = np.fft.rfft(values) / len(values)
+    k = np.arange(1, R + 1)
+    phases = np.exp(1j * k * base_frequency * shifts[0])
+    a = 2 * coeffs[1:] / phases   # f(x) = Re(c_0 + sum_k a_k e^{i k w x})
+
+    def f(x):
+        return np.real(coeffs[0] + np.sum(a * np.exp(1j * np.outer(x, k) * base_frequency), axis=-1))
+
+    if R == 1:
+        # a single sinusoid, minimal where its phase is pi
+        x = (np.pi - np.angle(a[0])) / base_frequency
+    else:
+        # dense scan over one period, refined by Newton steps
+        grid = np.linspace(0, 2*np.pi / base_frequency, 64 * R, endpoint=False)
+        x = grid[np.argmin(f(grid))]
+        for _ in range(5):
+            terms = a * np.exp(1j * k * base_frequency * x)
+            d1 = np.real(np.sum(1j * k * base_frequency * terms))
+            d2 = np.real(np.sum(-(k * base_frequency)**2 * terms))
+            if d2 <= 0:
+                break
+            x = x - d1 / d2
+    return float(x), float(f(np.array([x]))[0])
+
+
+def rotosolve(qnode, params, num_frequencies=1, base_frequency=1.0, max_sweeps=10, tol=1e-3):
+    """Sinusoid-fit (Rotosolve) optimization: with the other parameters
+    fixed, the cost is a trigonometric polynomial of each parameter, with
+    num_frequencies harmonics of base_frequency. It is rebuilt from
+    2 num_frequencies + 1 evaluations and set to its minimum, parameter by
+    parameter, sweep after sweep.
+
+    For a gate with a generator of eigenvalues +-1/2, such as the
+    DoubleExcitation of an ideal circuit, the defaults (a single sinusoid of
+    frequency 1, three evaluations) are exact and one sweep is enough. Noisy,
+    folded QNodes decompose the gate into RY(+-param/8) rotations with noise
+    in between: the sinusoid is then a close model, and a couple of sweeps
+    converge to the local minimum. Their exact spectrum (harmonics of 1/4)
+    has a period of 8 pi, and its global minimum may lie on another branch.
+
+    Args:
+        qnode (qml.QNode): The cost function.
+        params (np.array): The starting parameters, a scalar or a 1D array.
+        num_frequencies (int): The number of harmonics R.
+        base_frequency (float): The base frequency w.
+        max_sweeps (int): The maximum number of sweeps.
+        tol (float): Stops once a sweep moves the parameters by less than tol.
+
+    Returns:
+        params (np.array): The optimized parameters.
+        final_energy (float): Their energy.
+    """
+    scalar = np.ndim(params) == 0
+    params = np.array(params, dtype=float, requires_grad=False).reshape(-1)
+    period = 2*np.pi / base_frequency
+    offsets = np.arange(2*num_frequencies + 1) * period / (2*num_frequencies + 1)
+
+    def cost(x):
+        return float(qnode(x[0] if scalar else x))
+
+    shifts = offsets - offsets[num_frequencies]   # centred on the current value
+    for sweep in range(max_sweeps):
+        moved = 0.0
+        for i in range(len(params)):
+            values = []
+            for shift in shifts:
+                trial = params.copy()
+                trial[i] += shift
+                values.append(cost(trial))
+            step, _ = sinusoid_minimum(np.array(values), shifts, base_frequency)
+            step = (step + period/2) % period - period/2
+            params[i] += step
+            moved = max(moved, abs(step))
+        if moved < tol:
+            break
+
+    params = params[0] if scalar else params
+    return np.array(params, requires_grad=True), cost(params.reshape(-1))
+
+
+def VQE(qnode, param=0.0, num_iters=20, tol=None, optimizer="gradient"):
+    """Performs a VQE routine given a QNode.
+
+    Args:
+        qnode (qml.QNode):
+            The ansatz that will be optimized in order to find the ground state
+            of molecular hydrogen.
+        param (float): The starting parameter.
+        num_iters (int): The maximum number of steps.
+        tol (float): Optional tolerance on the energy change, for early stopping.
+        optimizer (str): "gradient" for gradient descent, "rotosolve" for the
+                         sinusoid fits of rotosolve (num_iters and tol unused).
+
+    Retuns:
+        final_energy (float): The final energy from the VQE routine.
+    """
+    if optimizer == "rotosolve":
+        return rotosolve(qnode, param)[1]
+    return vqe_optimize(qnode, param, num_iters, tol)[1]
 
 def qnode_ansatzes(d, scale_factors):
     """Generates ideal and mitigated qnodes.
@@ -81,12 +253,25 @@ def qnode_ansatzes(d, scale_factors):
 
     return qnode_ideal, qnodes_mitigated
 
-def extrapolation(d, scale_factors):
+def _mitigated_vqe(d, scale_factor, optimizer):
+    """Pool worker: VQE on the QNode folded by one scale factor. QNodes do not
+    pickle, the worker builds its own."""
+    _, (qnode,) = qnode_ansatzes(d, [scale_factor])
+    return VQE(qnode, optimizer=optimizer)
+
+
+def extrapolation(d, scale_factors, workers=None, mode="vqe", optimizer="gradient"):
     """Performs ZNE to obtain a zero-noise estimate on the ground state energy of H_2.
 
     Args:
         d (float): The distance between a hydrogen atom and the hydrogen molecule's centre of mass.
         scale_factors (list(int)): A list of scale factors used for ZNE.
+        workers (int): If given, the mitigated VQE runs are scheduled on a pool
+                       of workers processes, largest (slowest) scale factor first.
+        mode (str): "vqe" runs a VQE at each scale factor, "evaluate" only
+                    evaluates each mitigated QNode at the parameter of the
+                    ideal VQE.
+        optimizer (str): The optimizer of the VQE runs, see VQE.
 
     Returns:
         ideal_energy (float): The ideal energy from a noise-less VQE routine.
@@ -97,8 +282,25 @@ def extrapolation(d, scale_factors):
 
     qnode_ideal, qnodes_mitigated = qnode_ansatzes(d, scale_factors)
 
-    ideal_energy = np.round_(VQE(qnode_ideal), decimals=6)
-    mitigated_energies = [VQE(qnode) for qnode in qnodes_mitigated]
+    if mode == "evaluate":
+        if optimizer == "rotosolve":
+            param, energy = rotosolve(qnode_ideal, 0.0)
+        else:
+            param, energy = vqe_optimize(qnode_ideal)
+        ideal_energy = np.round_(energy, decimals=6)
+        mitigated_energies = [qnode(param) for qnode in qnodes_mitigated]
+
+    elif workers:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            order = sorted(range(len(scale_factors)), key=lambda i: -scale_factors[i])
+            futures = {i: pool.submit(_mitigated_vqe, d, scale_factors[i], optimizer) for i in order}
+
+            ideal_energy = np.round_(VQE(qnode_ideal, optimizer=optimizer), decimals=6)
+            mitigated_energies = [futures[i].result() for i in range(len(scale_factors))]
+
+    else:
+        ideal_energy = np.round_(VQE(qnode_ideal, optimizer=optimizer), decimals=6)
+        mitigated_energies = [VQE(qnode, optimizer=optimizer) for qnode in qnodes_mitigated]
 
     # Put your code here #
     coeffs = np.polyfit(scale_factors, mitigated_energies, 2)
@@ -106,6 +308,85 @@ def extrapolation(d, scale_factors):
 
     return np.array([ideal_energy, zne_energy]).tolist()
 
+def _curve_point(d, scale_factors, params, num_iters, tol):
+    """Curve worker: the ideal and ZNE energies at one distance.
+
+    Args:
+        params (list(float)): The starting parameters of the ideal VQE and
+                              of the VQE at each scale factor.
+
+    Returns:
+        energies (list(float)): The ideal and ZNE energies.
+        params (list(float)): The converged parameters, as given.
+    """
+    qnode_ideal, qnodes_mitigated = qnode_ansatzes(d, scale_factors)
+    results = [vqe_optimize(qnode, param, num_iters, tol)
+               for qnode, param in zip([qnode_ideal] + qnodes_mitigated, params)]
+
+    ideal_energy = float(results[0][1])
+    mitigated_energies = [float(energy) for _, energy in results[1:]]
+    zne_energy = np.polyfit(scale_factors, mitigated_energies, 2)[-1]
+
+    return [ideal_energy, float(zne_energy)], [float(param) for param, _ in results]
+
+
+def potential_energy_curve(distances, scale_factors, workers=None, num_iters=20, tol=1e-6):
+    """Ideal and ZNE energies of H_2 over a list of distances, on a process pool.
+
+    The first distances submitted are spread over the curve and start from
+    param = 0. Every following distance is the one closest to a finished
+    distance, and its VQE runs start from the converged parameters found
+    there, so that they stop after a few steps.
+
+    Args:
+        distances (list(float)): The distances between a hydrogen atom and the centre of mass.
+        scale_factors (list(int)): A list of scale factors used for ZNE.
+        workers (int): Number of worker processes, defaults to the cpu count.
+        num_iters (int): Maximum number of steps of each VQE.
+        tol (float): Tolerance on the energy change of the VQE steps.
+
+    Returns:
+        ideal_energies (np.array): The ideal energies at each distance.
+        zne_energies (np.array): The zero-noise estimates at each distance.
+    """
+    distances = [float(d) for d in distances]
+    # one worker per distance at most, so that the cold starts below are distinct
+    workers = max(1, min(workers or os.cpu_count(), len(distances)))
+    energies, params = {}, {}
+    todo = set(range(len(distances)))
+    cold = [0.0] * (len(scale_factors) + 1)
+
+    def nearest(i, among):
+        return min(among, key=lambda j: abs(distances[i] - distances[j]))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+
+        def submit(i, start):
+            todo.discard(i)
+            future = pool.submit(_curve_point, distances[i], scale_factors, start, num_iters, tol)
+            futures[future] = i
+
+        # cold starts, evenly spread over the curve
+        order = sorted(todo, key=lambda i: distances[i])
+        for i in dict.fromkeys(order[(2*k + 1) * len(order) // (2*workers)] for k in range(workers)):
+            submit(i, cold)
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                energies[i], params[i] = future.result()
+
+            # warm starts from the nearest finished neighbour
+            while todo and len(futures) < workers:
+                i = min(todo, key=lambda i: abs(distances[i] - distances[nearest(i, params)]))
+                submit(i, params[nearest(i, params)])
+
+    ideal_energies, zne_energies = np.array([energies[i] for i in range(len(distances))]).T
+    return ideal_energies, zne_energies
+
+
 # These functions are responsible for testing the solution.
 
 def run(test_case_input: str) -> str:
@@ -124,18 +405,19 @@ def check(solution_output: str, expected_output: str) -> None:
 
 test_cases = [['0.6614', '[-1.13619, -0.41168]']]
 
-for i, (input_, expected_output) in enumerate(test_cases):
-    print(f"Running test case {i} with input '{input_}'...")
-
-    try:
-        output = run(input_)
+if __name__ == "__main__":
+    for i, (input_, expected_output) in enumerate(test_cases):
+        print(f"Running test case {i} with input '{input_}'...")
 
-    except Exception as exc:
-        print(f"Runtime Error. {exc}")
+        try:
+            output = run(input_)
 
-    else:
-        if message := check(output, expected_output):
-            print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+        except Exception as exc:
+            print(f"Runtime Error. {exc}")
 
         else:
-            print("Correct!")
\ No newline at end of file
+            if message := check(output, expected_output):
+                print(f"Wrong Answer. Have: '{output}'. Want: '{expected_output}'.")
+
+            else:
+                print("Correct!")
\ No newline at end of file
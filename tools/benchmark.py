@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import pathlib
+import platform
+import resource
+import statistics
+import sys
+import time
+
+import challenges
+
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = challenges.ROOT / "tools" / "baseline.json"
+
+# Larger inputs for the challenges whose cost depends on their input, on top
+# of the test_cases of every script.
+SYNTHETIC_INPUTS = {
+    "09_faulty-supercomputer": {
+        "8-gates": '[["Hadamard","CNOT","PauliZ","CNOT","PauliX","CNOT","Hadamard","CNOT"],'
+                   '[0,[0,1],0,[1,0],1,[0,1],1,[1,0]],0.001,0.02]',
+    },
+    "11_vqe": {
+        "d=1.0": '1.0',
+    },
+    "12_fourier": {
+        "3-layers": '[[[2,2,2,2],[1,2,1,1],[0.5,0.3,0.1,0.7]],[[3,4,5,6],[1,1,1,1]],[[0.1,0.2,0.3,0.4]]]',
+    },
+    "14_fidelity": {
+        "Z": '[[0.7,1.3],"Z"]',
+    },
+}
+
+
+def list_benchmarks(scripts):
+    """
+    Builds the benchmark list: one entry per test case and synthetic input.
+
+    Args:
+        scripts (list(pathlib.Path)): The challenge scripts.
+
+    Returns:
+        (list(tuple)): (name, path, input) of every benchmark.
+    """
+    benchmarks = []
+    for path in scripts:
+        for i, (input_, _) in enumerate(challenges.read_test_cases(path)):
+            benchmarks.append((f"{path.stem}:case{i}", path, input_))
+        for label, input_ in SYNTHETIC_INPUTS.get(path.stem, {}).items():
+            benchmarks.append((f"{path.stem}:{label}", path, input_))
+    return benchmarks
+
+
+def time_run(run, input_, min_repeats=3, max_repeats=50, max_time=60.0, rtol=0.02):
+    """
+    Times run(input_) until the median is stable.
+
+    The timing stops as soon as the standard error of the mean, relative to
+    the median, falls below rtol (after at least min_repeats runs), or when
+    max_repeats runs or max_time seconds have been spent.
+
+    Returns:
+        (list(float)): The wall times of the runs, in seconds.
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeats:
+        t0 = time.perf_counter()
+        run(input_)
+        times.append(time.perf_counter() - t0)
+
+        if len(times) >= min_repeats:
+            sem = statistics.stdev(times) / len(times) ** 0.5
+            if sem <= rtol * statistics.median(times):
+                break
+            if time.perf_counter() - start >= max_time:
+                break
+    return times
+
+
+def percentile(values, q):
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _measure(path, input_, options, conn):
+    """Child process body: warm up, time, and report the peak RSS."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module = challenges.load_challenge(path)
+            for _ in range(options["warmup"]):
+                module.run(input_)
+            times = time_run(module.run, input_, options["min_repeats"],
+                             options["max_repeats"], options["max_time"], options["rtol"])
+    except Exception as exc:
+        conn.send({"error": f"{type(exc).__name__}: {exc}"})
+    else:
+        # ru_maxrss is in kilobytes on Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        conn.send({"median": statistics.median(times), "p95": percentile(times, 95),
+                   "repeats": len(times), "peak_rss_mb": rss})
+    conn.close()
+
+
+def measure(path, input_, options):
+    """
+    Runs one benchmark in a fresh process, so that its peak RSS is its own.
+
+    Returns:
+        (dict): median and p95 wall time [s], repeats and peak_rss_mb,
+                or error if the run raised.
+    """
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_measure, args=(path, input_, options, child))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"benchmark process died (exit code {process.exitcode})"}
+    process.join()
+    return result
+
+
+def environment():
+    import numpy
+    import pennylane
+
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "numpy": numpy.__version__, "pennylane": pennylane.__version__}
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline.
+
+    Args:
+        results (dict): name -> measurement, as returned by measure().
+        baseline (dict): The loaded baseline file.
+        threshold (float): Allowed relative slowdown of the median, e.g. 0.2.
+
+    Returns:
+        (dict): name -> ratio of the median to the baseline median, for the
+                benchmarks present in both.
+        (list(str)): Names of the benchmarks that regressed past threshold.
+    """
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"Unsupported baseline version {baseline.get('version')}, "
+                         f"expected {BASELINE_VERSION}")
+
+    ratios, regressed = {}, []
+    for name, result in results.items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None or "error" in result or "error" in reference:
+            continue
+        ratios[name] = result["median"] / reference["median"]
+        if ratios[name] > 1 + threshold:
+            regressed.append(name)
+    return ratios, regressed
+
+
+def print_report(results, ratios, regressed, file=sys.stdout):
+    width = max([len(name) for name in results] + [9])
+    print(f"{'benchmark':<{width}}  {'median [s]':>10}  {'p95 [s]':>10}  {'runs':>4}  "
+          f"{'peak RSS [MB]':>13}  {'vs base':>7}", file=file)
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<{width}}  {r['error']}", file=file)
+            continue
+        ratio = f"{ratios[name]:.2f}x" if name in ratios else "-"
+        flag = "  REGRESSED" if name in regressed else ""
+        print(f"{name:<{width}}  {r['median']:>10.4f}  {r['p95']:>10.4f}  {r['repeats']:>4}  "
+              f"{r['peak_rss_mb']:>13.1f}  {ratio:>7}{flag}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the run() of the challenge scripts against a stored baseline.")
+    parser.add_argument("challenges", nargs="*",
+                        help="challenge names or numbers (default: all)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE),
+                        help="baseline JSON file (default: %(default)s)")
+    parser.add_argument("--save", action="store_true",
+                        help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown of the median (default: %(default)s)")
+    parser.add_argument("--min-repeats", type=int, default=3)
+    parser.add_argument("--max-repeats", type=int, default=50)
+    parser.add_argument("--max-time", type=float, default=60.0,
+                        help="time budget per benchmark, in seconds (default: %(default)s)")
+    parser.add_argument("--rtol", type=float, default=0.02,
+                        help="target standard error of the timings, relative to "
+                             "their median (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="untimed runs before timing (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    options = {"min_repeats": args.min_repeats, "max_repeats": args.max_repeats,
+               "max_time": args.max_time, "rtol": args.rtol, "warmup": args.warmup}
+
+    # imported once here, so that the forked benchmarks inherit it
+    import pennylane  # noqa: F401
+
+    results = {}
+    for name, path, input_ in list_benchmarks(challenges.find_scripts(args.challenges)):
+        results[name] = measure(path, input_, options)
+        print(f"{name}: done", file=sys.stderr)
+
+    ratios, regressed = {}, []
+    baseline_path = pathlib.Path(args.baseline)
+    if baseline_path.exists() and not args.save:
+        ratios, regressed = compare(results, json.loads(baseline_path.read_text()),
+                                    args.threshold)
+
+    print_report(results, ratios, regressed)
+
+    if args.save:
+        baseline = {"version": BASELINE_VERSION,
+                    "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "environment": environment(), "options": options,
+                    "benchmarks": results}
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nBaseline written to {baseline_path}")
+
+    if regressed:
+        print(f"\n{len(regressed)} benchmark(s) regressed by more than "
+              f"{args.threshold:.0%}: {', '.join(regressed)}")
+        return 1
+    if any("error" in r for r in results.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import ast
+import importlib.util
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+LEVELS = ("1_explorer", "2_adventurer", "3_pioneer")
+
+
+def matches(name, selector):
+    """
+    Whether a challenge name is selected by a selector: the full name, or its
+    number with or without the leading zero ("11_vqe", "11", "03", "3").
+    """
+    number = name.split("_")[0]
+    if selector.isdigit() and number.isdigit():
+        return int(selector) == int(number)
+    return selector == name
+
+
+def find_scripts(selection=None):
+    """
+    Lists the challenge scripts, in challenge order.
+
+    Args:
+        selection (list(str)): Optional challenge names or number prefixes
+                               (e.g. "11", "11_vqe"). All scripts if None.
+
+    Returns:
+        (list(pathlib.Path)): Paths of the selected scripts.
+    """
+    scripts = sorted(
+        (path for level in LEVELS for path in (ROOT / level / "py").glob("*.py")),
+        key=lambda path: path.name,
+    )
+    if not selection:
+        return scripts
+
+    selected = [path for path in scripts if any(matches(path.stem, s) for s in selection)]
+    missing = [s for s in selection if not any(matches(path.stem, s) for path in scripts)]
+    if missing:
+        raise ValueError(f"Unknown challenge(s): {', '.join(missing)}")
+    return selected
+
+
+def read_test_cases(path):
+    """
+    Reads the test_cases literal of a script without importing it.
+
+    Args:
+        path (pathlib.Path): The challenge script.
+
+    Returns:
+        (list(list(str))): The [input, expected_output] pairs.
+    """
+    tree = ast.parse(pathlib.Path(path).read_text())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "test_cases" for t in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"{path} does not define test_cases")
+
+
+def load_challenge(path):
+    """
+    Imports a challenge script as a module. The test loop of the script is
+    guarded by __main__, so only the definitions (and module level devices or
+    QNodes) are built. Each script gets its own module name, challenge_<stem>,
+    so that its functions are told apart by __module__. Modules are cached in
+    sys.modules.
+
+    Args:
+        path (pathlib.Path): The challenge script.
+
+    Returns:
+        (module): The imported script, exposing run, check and test_cases.
+    """
+    path = pathlib.Path(path)
+    name = "challenge_" + path.stem.replace("-", "_")
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
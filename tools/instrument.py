@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pennylane as qml
+
+import challenges
+
+STAGES = ("construct", "expand", "execute")
+
+
+def _qnode_name(qnode):
+    """The module-qualified name of the QNode function, e.g.
+    challenge_01_differentiable_zne.bitflip_circuit: scripts reuse names such
+    as circuit, which must not merge into one row."""
+    func = getattr(qnode, "func", None)
+    qualname = getattr(func, "__qualname__", None)
+    if qualname is None:
+        return repr(qnode)
+    module = getattr(func, "__module__", None)
+    return f"{module}.{qualname}" if module else qualname
+
+
+def _device_classes():
+    """All the loaded device classes that define their own execute()."""
+    seen, stack = [], [qml.Device]
+    while stack:
+        cls = stack.pop()
+        if cls not in seen:
+            seen.append(cls)
+            stack.extend(cls.__subclasses__())
+    return [cls for cls in seen if "execute" in cls.__dict__]
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of QNode executions.
+
+    While enabled, every QNode call is recorded, whenever the QNode was
+    created, together with the time spent building its tape (construct),
+    expanding/decomposing it for the device (expand) and running it on the
+    device (execute), and the depth and wire count of the executed tape.
+
+    Enable the profiler before importing the challenge scripts: QNodes that
+    swap their device for backpropagation keep the expand_fn that existed
+    when they were created, so their expansion would be missed otherwise.
+
+    Usage:
+
+        with Profiler() as profiler:
+            module = challenges.load_challenge(path)
+            module.run(input_)
+        print(profiler.summary())
+        profiler.write_chrome_trace("trace.json")
+    """
+
+    def __init__(self):
+        self.events = []
+        self._patched = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    # ------------------------------------------------------------- patching
+
+    def _current(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def _record(self, name, cat, start, end, args=None):
+        event = {"name": name, "cat": cat, "ph": "X",
+                 "ts": (start - self._t0) * 1e6, "dur": (end - start) * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def _patch(self, cls, attr, make_wrapper):
+        original = cls.__dict__[attr]
+        self._patched.append((cls, attr, original))
+        setattr(cls, attr, functools.wraps(original)(make_wrapper(original)))
+
+    def _call(self, name, fn, *args, **kwargs):
+        """Runs fn as a recorded QNode call named name."""
+        record = {"name": name}
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self._record(name, "call", start, end,
+                         {k: v for k, v in record.items() if k != "name"})
+
+    def _wrap_call(self, original):
+        profiler = self
+
+        def __call__(qnode, *args, **kwargs):
+            return profiler._call(_qnode_name(qnode), original, qnode, *args, **kwargs)
+        return __call__
+
+    def _wrap_stage(self, stage, original):
+        profiler = self
+
+        def wrapper(obj, *args, **kwargs):
+            current = profiler._current()
+            if current is None and stage == "execute":
+                # tapes executed without a QNode call (e.g. by batch transforms
+                # such as fold_global) are recorded as calls of their device
+                name = f"[{getattr(obj, 'short_name', type(obj).__name__)}]"
+                return profiler._call(name, wrapper, obj, *args, **kwargs)
+
+            # devices such as default.mixed call the execute of their parent
+            # class, only the outermost one is recorded
+            if current is None or current.get("in_" + stage):
+                return original(obj, *args, **kwargs)
+
+            current["in_" + stage] = True
+            start = time.perf_counter()
+            try:
+                result = original(obj, *args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                del current["in_" + stage]
+            profiler._record(current["name"], stage, start, end)
+            if stage == "execute":
+                # depth is measured later, outside the timed calls
+                current["tape"] = args[0] if args else kwargs.get("circuit")
+            return result
+        return wrapper
+
+    def enable(self):
+        if self._patched:
+            return self
+        self._patch(qml.QNode, "__call__", self._wrap_call)
+        self._patch(qml.QNode, "construct", functools.partial(self._wrap_stage, "construct"))
+        self._patch(qml.Device, "expand_fn", functools.partial(self._wrap_stage, "expand"))
+        self._patch(qml.Device, "batch_transform",
+                    functools.partial(self._wrap_stage, "expand"))
+        for cls in _device_classes():
+            self._patch(cls, "execute", functools.partial(self._wrap_stage, "execute"))
+        return self
+
+    def disable(self):
+        while self._patched:
+            cls, attr, original = self._patched.pop()
+            setattr(cls, attr, original)
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    # ------------------------------------------------------------- reports
+
+    def _resolve(self):
+        """Replaces the executed tapes kept in the events by their depth and wires."""
+        depths = {}
+        for e in self.events:
+            tape = e.get("args", {}).pop("tape", None)
+            if tape is not None:
+                if id(tape) not in depths:
+                    depths[id(tape)] = tape.graph.get_depth()
+                e["args"]["depth"] = depths[id(tape)]
+                e["args"]["wires"] = len(tape.wires)
+
+    def stats(self):
+        """
+        Aggregates the events per QNode.
+
+        Returns:
+            (dict): QNode name -> calls, total time [s] of the calls and of
+                    each stage, mean depth and max wire count.
+        """
+        self._resolve()
+        stats = collections.OrderedDict()
+        for e in self.events:
+            s = stats.setdefault(e["name"], {"calls": 0, "total": 0.0, "depths": [],
+                                             "wires": 0, **{stage: 0.0 for stage in STAGES}})
+            if e["cat"] == "call":
+                s["calls"] += 1
+                s["total"] += e["dur"] / 1e6
+                args = e.get("args", {})
+                if "depth" in args:
+                    s["depths"].append(args["depth"])
+                    s["wires"] = max(s["wires"], args["wires"])
+            else:
+                s[e["cat"]] += e["dur"] / 1e6
+
+        for s in stats.values():
+            depths = s.pop("depths")
+            s["depth"] = sum(depths) / len(depths) if depths else 0.0
+        return stats
+
+    def summary(self):
+        """The stats as a text table, slowest QNode first."""
+        stats = sorted(self.stats().items(), key=lambda item: -item[1]["total"])
+        width = max([len(name) for name, _ in stats] + [5])
+        lines = [f"{'qnode':<{width}}  {'calls':>6}  {'total [s]':>9}  "
+                 + "  ".join(f"{stage + ' [s]':>11}" for stage in STAGES)
+                 + f"  {'depth':>6}  {'wires':>5}"]
+        for name, s in stats:
+            lines.append(f"{name:<{width}}  {s['calls']:>6}  {s['total']:>9.4f}  "
+                         + "  ".join(f"{s[stage]:>11.4f}" for stage in STAGES)
+                         + f"  {s['depth']:>6.1f}  {s['wires']:>5}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        """Writes the events in the Chrome trace format (chrome://tracing, Perfetto)."""
+        self._resolve()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Profile the QNode executions of the challenge test cases.")
+    parser.add_argument("challenges", nargs="*",
+                        help="challenge names or numbers (default: all)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace JSON file")
+    args = parser.parse_args(argv)
+
+    with Profiler() as profiler:
+        for path in challenges.find_scripts(args.challenges):
+            with contextlib.redirect_stdout(io.StringIO()):
+                module = challenges.load_challenge(path)
+                for input_, _ in module.test_cases:
+                    module.run(input_)
+
+    print(profiler.summary())
+    if args.trace:
+        profiler.write_chrome_trace(args.trace)
+        print(f"\nTrace written to {args.trace}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
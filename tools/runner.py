@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import challenges
+
+
+def run_case(path, index):
+    """
+    Runs one test case of a challenge script, in the current process.
+
+    Args:
+        path (pathlib.Path): The challenge script.
+        index (int): Index of the case in the test_cases of the script.
+
+    Returns:
+        (dict): challenge, case, status ("Correct", "Wrong Answer" or
+                "Runtime Error"), wall and cpu time of run() in seconds,
+                the time spent importing the script, and the message of
+                the failure, if any.
+    """
+    result = {"challenge": path.stem, "case": index, "status": "Runtime Error",
+              "wall": 0.0, "cpu": 0.0, "load": 0.0, "message": ""}
+
+    # the scripts are chatty, keep their prints out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        try:
+            module = challenges.load_challenge(path)
+        except Exception as exc:
+            result["message"] = f"Import Error. {exc}"
+            return result
+        result["load"] = time.perf_counter() - t0
+
+        input_, expected_output = module.test_cases[index]
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            output = module.run(input_)
+        except Exception as exc:
+            result["message"] = str(exc)
+            return result
+        finally:
+            result["wall"] = time.perf_counter() - wall
+            result["cpu"] = time.process_time() - cpu
+
+        try:
+            message = module.check(output, expected_output)
+        except AssertionError as exc:
+            message = str(exc) or "check failed"
+        except Exception as exc:
+            result["message"] = str(exc)
+            return result
+
+    if message:
+        result["status"] = "Wrong Answer"
+        result["message"] = f"Have: '{output}'. Want: '{expected_output}'. {message}"
+    else:
+        result["status"] = "Correct"
+    return result
+
+
+def run_suite(scripts, workers=None):
+    """
+    Runs all the test cases of the given scripts on a process pool.
+
+    Args:
+        scripts (list(pathlib.Path)): The challenge scripts.
+        workers (int): Number of worker processes, defaults to the cpu count.
+
+    Returns:
+        (list(dict)): The results of run_case, in challenge and case order.
+    """
+    tasks = [(path, index)
+             for path in scripts
+             for index in range(len(challenges.read_test_cases(path)))]
+
+    # import pennylane once here, so that forked workers inherit it
+    import pennylane  # noqa: F401
+
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        # the pioneer challenges are the slowest ones: submit them first so
+        # that the suite ends close to when its slowest case does
+        futures = {pool.submit(run_case, path, index): (path.name, index)
+                   for path, index in reversed(tasks)}
+        results = []
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                name, index = futures[future]
+                results.append({"challenge": name[:-3], "case": index,
+                                "status": "Runtime Error", "wall": 0.0, "cpu": 0.0,
+                                "load": 0.0, "message": f"Worker Error. {exc}"})
+
+    return sorted(results, key=lambda r: (r["challenge"], r["case"]))
+
+
+def print_report(results, elapsed, file=sys.stdout):
+    width = max([len(r["challenge"]) for r in results] + [9])
+    print(f"{'challenge':<{width}}  case  {'status':<13}  {'wall [s]':>9}  {'cpu [s]':>9}",
+          file=file)
+    for r in results:
+        print(f"{r['challenge']:<{width}}  {r['case']:>4}  {r['status']:<13}  "
+              f"{r['wall']:>9.3f}  {r['cpu']:>9.3f}", file=file)
+        if r["status"] != "Correct":
+            print(f"{'':<{width}}        {r['message']}", file=file)
+
+    passed = sum(r["status"] == "Correct" for r in results)
+    serial = sum(r["wall"] + r["load"] for r in results)
+    print(f"\n{passed}/{len(results)} correct, "
+          f"{elapsed:.2f} s elapsed ({serial:.2f} s of case time)", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the test cases of the challenge scripts on a process pool.")
+    parser.add_argument("challenges", nargs="*",
+                        help="challenge names or numbers (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of worker processes (default: cpu count)")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    scripts = challenges.find_scripts(args.challenges)
+
+    t0 = time.perf_counter()
+    results = run_suite(scripts, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    print_report(results, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"elapsed": elapsed, "results": results}, f, indent=2)
+
+    return 0 if all(r["status"] == "Correct" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import http.server
+import io
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import urllib.request
+
+import challenges
+
+_modules = {}
+
+
+def _load(scripts):
+    """Imports the challenge scripts into this process, keyed by name."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in scripts:
+            _modules[path.stem] = challenges.load_challenge(path)
+
+
+def _warmup():
+    """Runs every test case once, so that the lazy imports and caches of
+    PennyLane are paid before the first request."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for module in _modules.values():
+            for input_, _ in module.test_cases:
+                try:
+                    module.run(input_)
+                except Exception:
+                    pass
+
+
+def _ping():
+    return True
+
+
+def _run(name, input_):
+    """Worker body: run() of a warm challenge module, with its timing."""
+    module = _modules[name]
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        output = module.run(input_)
+    return output, time.perf_counter() - t0
+
+
+class Latencies:
+    """Thread-safe per-challenge record of the request latencies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = collections.defaultdict(list)
+
+    def add(self, name, latency):
+        with self._lock:
+            self._data[name].append(latency)
+
+    def summary(self):
+        with self._lock:
+            data = {name: sorted(values) for name, values in self._data.items()}
+        return {name: {"count": len(v), "mean": sum(v) / len(v),
+                       "p50": v[len(v) // 2], "p95": v[min(len(v) - 1, int(0.95 * len(v)))],
+                       "max": v[-1]}
+                for name, v in data.items()}
+
+
+class WorkerServer(http.server.ThreadingHTTPServer):
+    """
+    Localhost HTTP server answering run() requests of the challenge scripts.
+
+    The scripts are imported (and optionally warmed up) once, in the server
+    process, before the worker processes are forked: the workers inherit
+    PennyLane and the module level devices and QNodes. QNodes are not
+    thread-safe, so each request is run in one of `concurrency` worker
+    processes; further requests wait in line.
+
+        POST /run/<challenge>   body: the test case input, as in run()
+        GET  /challenges        loaded challenge names
+        GET  /stats             latency summary per challenge
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, scripts, concurrency=1, warmup=False):
+        _load(scripts)
+        if warmup:
+            _warmup()
+        self.names = sorted(_modules)
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=concurrency, mp_context=multiprocessing.get_context("fork"))
+        # fork the workers now, while the modules are warm
+        self.pool.submit(_ping).result()
+        self.latencies = Latencies()
+        super().__init__(address, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/challenges":
+            self._reply(200, self.server.names)
+        elif self.path == "/stats":
+            self._reply(200, self.server.latencies.summary())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        prefix = "/run/"
+        if not self.path.startswith(prefix):
+            return self._reply(404, {"error": f"unknown path {self.path}"})
+
+        name = self.path[len(prefix):]
+        matches = [n for n in self.server.names if challenges.matches(n, name)]
+        if len(matches) != 1:
+            return self._reply(404, {"error": f"unknown challenge {name}"})
+        name = matches[0]
+
+        input_ = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        try:
+            output, run_time = self.server.pool.submit(_run, name, input_).result()
+        except Exception as exc:
+            return self._reply(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+        latency = time.perf_counter() - t0
+        self.server.latencies.add(name, latency)
+        self._reply(200, {"challenge": name, "output": output,
+                          "run_time": run_time, "latency": latency})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def call(challenge, input_, url="http://127.0.0.1:8765"):
+    """
+    Sends a run() request to a running worker.
+
+    Args:
+        challenge (str): Challenge name or number, e.g. "11" or "11_vqe".
+        input_ (str): The test case input.
+        url (str): Address of the worker.
+
+    Returns:
+        (dict): challenge, output, run_time and latency [s] of the request.
+    """
+    request = urllib.request.Request(f"{url}/run/{challenge}", data=input_.encode(),
+                                     method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Long-lived worker keeping the challenge scripts imported.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="start the worker")
+    serve.add_argument("challenges", nargs="*",
+                       help="challenge names or numbers to load (default: all)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("-c", "--concurrency", type=int, default=1,
+                       help="maximum number of requests run at once (default: %(default)s)")
+    serve.add_argument("--warmup", action="store_true",
+                       help="run every test case once before forking the workers")
+
+    client = sub.add_parser("call", help="send one run() request to a worker")
+    client.add_argument("challenge")
+    client.add_argument("input", help="the test case input, as a string")
+    client.add_argument("--url", default="http://127.0.0.1:8765")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "call":
+        print(json.dumps(call(args.challenge, args.input, args.url), indent=2))
+        return 0
+
+    server = WorkerServer((args.host, args.port), challenges.find_scripts(args.challenges),
+                          args.concurrency, args.warmup)
+    print(f"Serving {len(server.names)} challenges on http://{args.host}:{args.port} "
+          f"with concurrency {args.concurrency}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())